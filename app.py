@@ -11,6 +11,8 @@
 # - Uses st.query_params instead of deprecated experimental calls
 # - Updated use_column_width to use_container_width
 # - Increased instruction display limit to 1000 characters
+# - Carbon Analytics page backed by incremental rollups over all saved plans
+# - Recipe collections (data/recipe_collections.json) materialized over a local recipe catalog
 
 import os
 import json
@@ -19,10 +21,13 @@ import uuid
 import requests
 import datetime
 import logging
+import threading
 from collections import defaultdict
 
 import streamlit as st
 import pandas as pd
+import numpy as np
+import plotly.express as px
 
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
@@ -40,12 +45,20 @@ MEALDB_ROOT = f"{MEALDB_BASE}/{MEALDB_KEY}"
 
 SAVE_DIR = "saved_plans"
 os.makedirs(SAVE_DIR, exist_ok=True)
+# Derived analytics state, kept out of SAVE_DIR so no uid can name (and overwrite) it
+ROLLUP_DIR = "analytics_rollups"
 
 st.set_page_config(page_title="EcoMealAI", page_icon="🥗", layout="wide")
 
 # ---------------------------
 # Helper Functions (Moved to Top)
 # ---------------------------
+def _plan_path(uid: str):
+    # uid comes from the URL; only accept a plain file name inside SAVE_DIR
+    if not uid or uid in (".", "..") or os.path.basename(uid) != uid or "\\" in uid:
+        return None
+    return os.path.join(SAVE_DIR, f"{uid}.json")
+
 def server_save_plan(uid: str):
     payload = {
         "weekly_plan": st.session_state.get("weekly_plan", {}),
@@ -53,16 +66,24 @@ def server_save_plan(uid: str):
         "preferences": st.session_state.get("preferences", {}),
         "saved_at": datetime.datetime.utcnow().isoformat() + "Z"
     }
-    path = os.path.join(SAVE_DIR, f"{uid}.json")
+    path = _plan_path(uid)
+    if path is None:
+        return False, "Invalid uid"
     try:
         with open(path, "w", encoding="utf-8") as f:
             json.dump(payload, f, indent=2, ensure_ascii=False)
-        return True, path
     except Exception as e:
         return False, str(e)
+    try:
+        update_carbon_rollups(uid, payload)
+    except Exception as e:
+        logger.error(f"update_carbon_rollups('{uid}') failed: {e}")
+    return True, path
 
 def server_load_plan(uid: str):
-    path = os.path.join(SAVE_DIR, f"{uid}.json")
+    path = _plan_path(uid)
+    if path is None:
+        return False, "Invalid uid"
     if not os.path.exists(path):
         return False, "No saved plan for this uid"
     try:
@@ -106,6 +127,8 @@ if "planner_cuisine" not in st.session_state:
     st.session_state["planner_cuisine"] = "Any"
 if "planner_diet" not in st.session_state:
     st.session_state["planner_diet"] = "Any"
+if "planner_collection" not in st.session_state:
+    st.session_state["planner_collection"] = "Any"
 
 if "uid" not in st.session_state:
     try:
@@ -250,6 +273,380 @@ def estimate_recipe_carbon_from_ingredients(ingredients):
             total += 0.1
     return round(total, 2)
 
+# ---------------------------
+# Carbon analytics (bulk scan + incremental rollups)
+# ---------------------------
+# totals.json holds the aggregate; contributions/ holds one small file per (uid, week)
+# so a save only rewrites its own contribution plus the totals.
+ROLLUP_TOTALS_PATH = os.path.join(ROLLUP_DIR, "totals.json")
+ROLLUP_CONTRIB_DIR = os.path.join(ROLLUP_DIR, "contributions")
+ROLLUP_SCAN_BATCH = 200
+MEAL_DIMENSIONS = ["week", "day", "meal_type", "cuisine"]
+ROLLUP_DIMENSIONS = MEAL_DIMENSIONS + ["ingredient"]
+
+@st.cache_resource
+def _rollup_lock():
+    # Shared across sessions so concurrent saves don't interleave read-modify-write
+    return threading.Lock()
+
+def iter_saved_plans(save_dir=SAVE_DIR):
+    # Stream plans one file at a time instead of loading the whole folder
+    with os.scandir(save_dir) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    plan = json.load(f)
+            except Exception as e:
+                logger.error(f"iter_saved_plans: skipping {entry.path}: {e}")
+                continue
+            if isinstance(plan, dict):
+                yield entry.name[:-len(".json")], plan
+
+def _plan_week(saved_at):
+    if not isinstance(saved_at, str):
+        return "Unknown"
+    try:
+        dt = datetime.datetime.fromisoformat(saved_at.rstrip("Z"))
+    except ValueError:
+        return "Unknown"
+    year, week, _ = dt.isocalendar()
+    return f"{year}-W{week:02d}"
+
+def _contribution_key(uid, week):
+    return f"{uid}@{week}"
+
+def _plan_carbon_rows(key, plan, week):
+    meal_rows, ingredient_rows = [], []
+    weekly_plan = plan.get("weekly_plan")
+    if not isinstance(weekly_plan, dict):
+        return meal_rows, ingredient_rows
+    for day, meals in weekly_plan.items():
+        if not isinstance(meals, dict):
+            continue
+        for meal_type, recipe in meals.items():
+            if not isinstance(recipe, dict):
+                continue
+            ingredients = [ing for ing in (recipe.get("ingredients") or []) if isinstance(ing, dict)]
+            carbon = recipe.get("carbon")
+            if carbon is None:
+                carbon = estimate_recipe_carbon_from_ingredients(ingredients)
+            meal_rows.append((key, week, day, meal_type, recipe.get("area") or "Unknown", carbon))
+            for ing in ingredients:
+                name = str(ing.get("name") or "").strip().lower()
+                if name:
+                    ingredient_rows.append((key, name))
+    return meal_rows, ingredient_rows
+
+def _ingredient_carbon(names):
+    # Vectorised CARBON_KEYWORDS lookup: first keyword match wins, unmatched = 0.1,
+    # same as estimate_recipe_carbon_from_ingredients
+    names = names.astype(str)
+    conditions = [names.str.contains(k, regex=False).to_numpy() for k in CARBON_KEYWORDS]
+    return np.select(conditions, list(CARBON_KEYWORDS.values()), default=0.1)
+
+def _empty_carbon_summary():
+    summary = {"plans": 0, "meals": 0, "total": 0.0}
+    for dim in ROLLUP_DIMENSIONS:
+        summary[dim] = {}
+    return summary
+
+def summarize_carbon_rows(keys, meal_rows, ingredient_rows):
+    meals = pd.DataFrame(meal_rows, columns=["key"] + MEAL_DIMENSIONS + ["carbon"])
+    meals["carbon"] = pd.to_numeric(meals["carbon"], errors="coerce").fillna(0.0)
+    ings = pd.DataFrame(ingredient_rows, columns=["key", "ingredient"])
+    ings["carbon"] = _ingredient_carbon(ings["ingredient"])
+    summaries = {key: _empty_carbon_summary() for key in keys}
+    for key in summaries:
+        summaries[key]["plans"] = 1
+    by_key = meals.groupby("key")["carbon"].agg(["size", "sum"])
+    for key, row in by_key.iterrows():
+        summaries[key]["meals"] = int(row["size"])
+        summaries[key]["total"] = round(float(row["sum"]), 4)
+    for dim in MEAL_DIMENSIONS:
+        for (key, value_key), value in meals.groupby(["key", dim])["carbon"].sum().items():
+            summaries[key][dim][value_key] = round(float(value), 4)
+    for (key, value_key), value in ings.groupby(["key", "ingredient"])["carbon"].sum().items():
+        summaries[key]["ingredient"][value_key] = round(float(value), 4)
+    return summaries
+
+def _merge_carbon_summary(acc, summary, sign=1):
+    acc["plans"] = acc.get("plans", 0) + sign * summary.get("plans", 0)
+    acc["meals"] = acc.get("meals", 0) + sign * summary.get("meals", 0)
+    acc["total"] = round(acc.get("total", 0.0) + sign * summary.get("total", 0.0), 4)
+    for dim in ROLLUP_DIMENSIONS:
+        bucket = acc.setdefault(dim, {})
+        for key, value in summary.get(dim, {}).items():
+            new_value = round(bucket.get(key, 0.0) + sign * value, 4)
+            if abs(new_value) < 1e-6:
+                bucket.pop(key, None)
+            else:
+                bucket[key] = new_value
+    return acc
+
+def scan_carbon_rollups(save_dir=SAVE_DIR, batch_size=ROLLUP_SCAN_BATCH):
+    rollups = {"contributions": {}, "totals": _empty_carbon_summary()}
+    keys, meal_rows, ingredient_rows = [], [], []
+
+    def flush():
+        for key, summary in summarize_carbon_rows(keys, meal_rows, ingredient_rows).items():
+            rollups["contributions"][key] = summary
+            _merge_carbon_summary(rollups["totals"], summary)
+        keys.clear()
+        meal_rows.clear()
+        ingredient_rows.clear()
+
+    for uid, plan in iter_saved_plans(save_dir):
+        week = _plan_week(plan.get("saved_at"))
+        key = _contribution_key(uid, week)
+        plan_meals, plan_ings = _plan_carbon_rows(key, plan, week)
+        keys.append(key)
+        meal_rows.extend(plan_meals)
+        ingredient_rows.extend(plan_ings)
+        if len(keys) >= batch_size:
+            flush()
+    if keys:
+        flush()
+    return rollups
+
+def _read_rollup_json(path):
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"_read_rollup_json('{path}') failed: {e}")
+        return None
+
+def _write_rollup_json(path, obj):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(obj, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _contribution_path(key):
+    return os.path.join(ROLLUP_CONTRIB_DIR, f"{key}.json")
+
+def _write_rollup_totals(totals):
+    totals["updated_at"] = datetime.datetime.utcnow().isoformat() + "Z"
+    _write_rollup_json(ROLLUP_TOTALS_PATH, totals)
+
+def _rebuild_carbon_rollups_locked():
+    rollups = scan_carbon_rollups()
+    os.makedirs(ROLLUP_CONTRIB_DIR, exist_ok=True)
+    # Only the latest week of each plan can be rescanned. Older-week contributions are
+    # kept while their uid still has a plan file; anything else is stale and removed.
+    with os.scandir(ROLLUP_CONTRIB_DIR) as entries:
+        for entry in entries:
+            if not entry.name.endswith(".json"):
+                continue
+            key = entry.name[:-len(".json")]
+            if key in rollups["contributions"]:
+                continue
+            uid = key.rsplit("@", 1)[0]
+            previous = _read_rollup_json(entry.path) if os.path.exists(_plan_path(uid) or "") else None
+            if previous:
+                _merge_carbon_summary(rollups["totals"], previous)
+            else:
+                os.remove(entry.path)
+    for key, summary in rollups["contributions"].items():
+        _write_rollup_json(_contribution_path(key), summary)
+    _write_rollup_totals(rollups["totals"])
+
+def rebuild_carbon_rollups():
+    with _rollup_lock():
+        _rebuild_carbon_rollups_locked()
+
+def update_carbon_rollups(uid, plan):
+    with _rollup_lock():
+        totals = _read_rollup_json(ROLLUP_TOTALS_PATH)
+        if totals is None:
+            # First save (or unreadable totals): the full scan already includes this plan
+            _rebuild_carbon_rollups_locked()
+            return
+        week = _plan_week(plan.get("saved_at"))
+        key = _contribution_key(uid, week)
+        path = _contribution_path(key)
+        previous = _read_rollup_json(path)
+        if previous:
+            _merge_carbon_summary(totals, previous, sign=-1)
+        meal_rows, ingredient_rows = _plan_carbon_rows(key, plan, week)
+        summary = summarize_carbon_rows([key], meal_rows, ingredient_rows)[key]
+        _merge_carbon_summary(totals, summary)
+        os.makedirs(ROLLUP_CONTRIB_DIR, exist_ok=True)
+        _write_rollup_json(path, summary)
+        _write_rollup_totals(totals)
+
+@st.cache_data(max_entries=1)
+def _cached_rollup_frames(mtime_ns):
+    # Keyed on the totals file's mtime so every save invalidates the cache
+    totals = _read_rollup_json(ROLLUP_TOTALS_PATH) or _empty_carbon_summary()
+    frames = {
+        dim: pd.DataFrame(list(totals.get(dim, {}).items()), columns=[dim, "carbon"])
+        for dim in ROLLUP_DIMENSIONS
+    }
+    stats = {k: totals.get(k, 0) for k in ["plans", "meals", "total"]}
+    return stats, frames
+
+def load_carbon_rollup_frames():
+    if not os.path.exists(ROLLUP_TOTALS_PATH):
+        rebuild_carbon_rollups()
+    return _cached_rollup_frames(os.stat(ROLLUP_TOTALS_PATH).st_mtime_ns)
+
+# ---------------------------
+# Recipe collections (local catalog + materialized membership)
+# ---------------------------
+COLLECTIONS_PATH = os.path.join("data", "recipe_collections.json")
+# Every recipe we've parsed from TheMealDB, one file per recipe, so collections can be
+# browsed offline. Kept out of SAVE_DIR so no uid can overwrite it.
+CATALOG_DIR = "recipe_catalog"
+CATALOG_MAX_RECIPES = 5000
+
+# Tags in recipe_collections.json that imply rule-based membership.
+# No prep-time data is available, so "quick" uses ingredient count as a proxy.
+COLLECTION_TAG_RULES = {
+    "quick": {"max_ingredients": 8},
+    "easy": {"max_ingredients": 8},
+    "sustainable": {"max_carbon": 2.0},
+    "eco-friendly": {"max_carbon": 2.0},
+    "healthy": {"exclude_categories": ["Dessert"]},
+    "nutritious": {"exclude_categories": ["Dessert"]},
+}
+
+def _load_collection_definitions():
+    try:
+        with open(COLLECTIONS_PATH, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except Exception as e:
+        logger.error(f"_load_collection_definitions failed: {e}")
+        return {}
+
+def _catalog_path(rid):
+    rid = str(rid)
+    if rid in (".", "..") or os.path.basename(rid) != rid or "\\" in rid:
+        return None
+    return os.path.join(CATALOG_DIR, f"{rid}.json")
+
+def _load_recipe_catalog():
+    catalog = {}
+    if not os.path.isdir(CATALOG_DIR):
+        return catalog
+    with os.scandir(CATALOG_DIR) as entries:
+        for entry in entries:
+            if not entry.is_file() or not entry.name.endswith(".json"):
+                continue
+            try:
+                with open(entry.path, "r", encoding="utf-8") as f:
+                    doc = json.load(f)
+            except Exception as e:
+                logger.error(f"_load_recipe_catalog: skipping {entry.path}: {e}")
+                continue
+            if not isinstance(doc, dict) or not doc.get("id") or not isinstance(doc.get("ingredients", []), list):
+                logger.error(f"_load_recipe_catalog: skipping invalid recipe {entry.path}")
+                continue
+            doc["id"] = str(doc["id"])
+            catalog[doc["id"]] = doc
+    return catalog
+
+def _write_catalog_recipe(entry):
+    path = _catalog_path(entry["id"])
+    if path is None:
+        return
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(entry, f, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+def _collection_rule(definition):
+    rule = {}
+    for tag in definition.get("tags", []):
+        for key, value in COLLECTION_TAG_RULES.get(tag, {}).items():
+            if key == "exclude_categories":
+                rule[key] = sorted(set(rule.get(key, [])) | set(value))
+            else:
+                rule[key] = min(rule.get(key, value), value)
+    return rule or None
+
+def _recipe_matches_rule(doc, rule):
+    if "max_carbon" in rule and (doc.get("carbon") or 0.0) >= rule["max_carbon"]:
+        return False
+    if "max_ingredients" in rule and len(doc.get("ingredients", [])) > rule["max_ingredients"]:
+        return False
+    if doc.get("category") in rule.get("exclude_categories", []):
+        return False
+    return True
+
+def _index_recipe(store, doc):
+    rid = doc["id"]
+    for name, rule in store["rules"].items():
+        if rule is None or rid in store["explicit"][name]:
+            continue
+        if _recipe_matches_rule(doc, rule):
+            store["members"][name].add(rid)
+        else:
+            store["members"][name].discard(rid)
+
+@st.cache_resource
+def _collection_store():
+    # Loaded once per server process and shared by all sessions
+    definitions = _load_collection_definitions()
+    store = {
+        "lock": threading.Lock(),
+        "definitions": definitions,
+        "rules": {name: _collection_rule(d) for name, d in definitions.items()},
+        "explicit": {name: {str(r) for r in d.get("recipe_ids", [])} for name, d in definitions.items()},
+        "catalog": _load_recipe_catalog(),
+    }
+    store["members"] = {name: set(ids) for name, ids in store["explicit"].items()}
+    for doc in store["catalog"].values():
+        _index_recipe(store, doc)
+    return store
+
+def list_collections():
+    # Rule-based collections, plus explicit-id collections once one of their ids is in the catalog
+    store = _collection_store()
+    with store["lock"]:
+        return sorted(
+            name for name in store["definitions"]
+            if store["rules"][name] or any(rid in store["catalog"] for rid in store["explicit"][name])
+        )
+
+def add_recipes_to_catalog(docs):
+    store = _collection_store()
+    changed = []
+    with store["lock"]:
+        for doc in docs:
+            if not doc or not doc.get("id"):
+                continue
+            entry = {k: v for k, v in doc.items() if not k.startswith("_")}
+            entry["id"] = str(entry["id"])
+            if entry.get("carbon") is None:
+                entry["carbon"] = estimate_recipe_carbon_from_ingredients(entry.get("ingredients", []))
+            if store["catalog"].get(entry["id"]) == entry:
+                continue
+            if entry["id"] not in store["catalog"] and len(store["catalog"]) >= CATALOG_MAX_RECIPES:
+                logger.debug(f"add_recipes_to_catalog: catalog full, not adding {entry['id']}")
+                continue
+            store["catalog"][entry["id"]] = entry
+            _index_recipe(store, entry)
+            changed.append(entry)
+    # Only the new/changed recipes are written, outside the lock
+    for entry in changed:
+        try:
+            _write_catalog_recipe(entry)
+        except Exception as e:
+            logger.error(f"_write_catalog_recipe('{entry['id']}') failed: {e}")
+
+def collection_recipes(name):
+    store = _collection_store()
+    with store["lock"]:
+        ids = store["members"].get(name, set())
+        docs = [dict(store["catalog"][rid]) for rid in ids if rid in store["catalog"]]
+    return sorted(docs, key=lambda d: d.get("carbon", 999.0))
+
 # ---------------------------
 # Candidate selection & helper functions
 # ---------------------------
@@ -263,20 +660,20 @@ def current_weekly_plan_ids():
                     used.add(str(recipe.get("id")))
     return used
 
-def get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbon, top_n=3, exclude_ids=None):
-    if exclude_ids is None:
-        exclude_ids = set()
-    pool = []
-    tried = set()
+def meal_type_keywords(meal_type):
     meal_low = (meal_type or "").lower()
     if "breakfast" in meal_low:
-        keywords = ["Breakfast", "Egg", "Pancake", "Toast", "Omelet"]
+        return ["Breakfast", "Egg", "Pancake", "Toast", "Omelet"]
     elif "lunch" in meal_low:
-        keywords = ["Salad", "Sandwich", "Soup", "Rice"]
+        return ["Salad", "Sandwich", "Soup", "Rice"]
     elif "dinner" in meal_low:
-        keywords = ["Curry", "Stew", "Pasta", "Chicken", "Fish"]
-    else:
-        keywords = ["Meal", "Rice", "Pasta", "Salad"]
+        return ["Curry", "Stew", "Pasta", "Chicken", "Fish"]
+    return ["Meal", "Rice", "Pasta", "Salad"]
+
+def _mealdb_candidate_pool(meal_type, cuisine_pref, top_n, exclude_ids):
+    pool = []
+    tried = set()
+    keywords = meal_type_keywords(meal_type)
     for kw in keywords:
         results = mealdb_search_by_name(kw)
         for r in results:
@@ -314,6 +711,42 @@ def get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbo
                 pool.append(doc)
             if len(pool) >= top_n * 4:
                 break
+    add_recipes_to_catalog(pool)
+    return pool
+
+def _matches_meal_type(doc, meal_type):
+    title = (doc.get("title") or "").lower()
+    category = (doc.get("category") or "").lower()
+    return any(kw.lower() in title or kw.lower() == category for kw in meal_type_keywords(meal_type))
+
+def _collection_candidate_pool(collection, meal_type, cuisine_pref, exclude_ids):
+    # Drawn from the local catalog only: no network calls.
+    # Breakfast only takes breakfast-like recipes; other slots skip breakfast/dessert
+    # and rank recipes matching the meal-type keywords first.
+    is_breakfast = "breakfast" in (meal_type or "").lower()
+    pool = []
+    for doc in collection_recipes(collection):
+        if doc["id"] in exclude_ids:
+            continue
+        matches = _matches_meal_type(doc, meal_type)
+        if is_breakfast and not matches:
+            continue
+        if not is_breakfast and doc.get("category") in ("Breakfast", "Dessert"):
+            continue
+        penalty = 0.0 if matches else 0.5
+        if cuisine_pref and cuisine_pref != "Any" and doc.get("area", "").lower() != cuisine_pref.lower():
+            penalty += 0.5
+        doc["_score_penalty"] = penalty
+        pool.append(doc)
+    return pool
+
+def get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbon, top_n=3, exclude_ids=None, collection=None):
+    if exclude_ids is None:
+        exclude_ids = set()
+    if collection:
+        pool = _collection_candidate_pool(collection, meal_type, cuisine_pref, exclude_ids)
+    else:
+        pool = _mealdb_candidate_pool(meal_type, cuisine_pref, top_n, exclude_ids)
     random.shuffle(pool)
     if st.session_state.get("preferences", {}).get("sustainability", True):
         pool = sorted(pool, key=lambda c: (c.get("carbon", 999.0) + c.get("_score_penalty", 0.0)))
@@ -335,9 +768,17 @@ def open_candidate_picker(day, meal_type):
     max_carbon = st.session_state.get("planner_max_carbon", 5.0)
     cuisine_pref = st.session_state.get("planner_cuisine", "Any")
     diet_pref = st.session_state.get("planner_diet", "Any")
+    collection = st.session_state.get("planner_collection", "Any")
     exclude = current_weekly_plan_ids()
-    candidates = get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbon, top_n=3, exclude_ids=exclude)
-    st.session_state["__candidate_picker"] = {"day": day, "meal_type": meal_type, "candidates": candidates}
+    note = None
+    candidates = []
+    if collection != "Any":
+        candidates = get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbon, top_n=3, exclude_ids=exclude, collection=collection)
+        if not candidates:
+            note = f"No {meal_type} recipes in the '{collection}' collection yet. Recipes are added as you search and plan, so showing TheMealDB suggestions instead."
+    if not candidates:
+        candidates = get_candidates_for_preferences(meal_type, cuisine_pref, diet_pref, max_carbon, top_n=3, exclude_ids=exclude)
+    st.session_state["__candidate_picker"] = {"day": day, "meal_type": meal_type, "candidates": candidates, "note": note}
 
 def confirm_candidate_pick(selected_id):
     if not st.session_state.get("__candidate_picker"):
@@ -456,6 +897,44 @@ def preferences_ui():
 # ---------------------------
 # Recipe Finder UI
 # ---------------------------
+def render_recipe_card(parsed):
+    with st.expander(parsed.get("title")):
+        image_url = parsed.get("image")
+        if image_url and isinstance(image_url, str) and image_url.startswith("http"):
+            try:
+                st.image(image_url, use_container_width=False, width=250)
+            except Exception as e:
+                st.write("Image not available for this recipe.")
+                logger.error(f"Failed to load image {image_url}: {e}")
+        else:
+            st.write("Image not available for this recipe.")
+            logger.debug(f"No valid image for recipe {parsed.get('title')}: {image_url}")
+        st.markdown(f"**Cuisine / Area:** {parsed.get('area')}")
+        st.markdown("**Ingredients:**")
+        for ing in parsed.get("ingredients", []):
+            st.write(f"- {ing.get('name')} — {ing.get('amount')}")
+        st.markdown("**Instructions:**")
+        st.write(parsed.get("instructions")[:1000] + ("..." if len(parsed.get("instructions", ""))>1000 else ""))
+        carbon_est = parsed.get("carbon")
+        if carbon_est is None:
+            carbon_est = estimate_recipe_carbon_from_ingredients(parsed.get("ingredients", []))
+        st.info(f"Estimated recipe carbon footprint (heuristic): {carbon_est:.2f} kg CO₂")
+        pick_col1, pick_col2 = st.columns([1,3])
+        with pick_col1:
+            st.caption("Quick add to plan:")
+            day = st.selectbox("Day", ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"], key=f"quick_day_{parsed['id']}")
+            meal_type = st.selectbox("Meal", ["Breakfast","Lunch","Dinner"], key=f"quick_meal_{parsed['id']}")
+            if st.button("➕ Add to Plan", key=f"quick_add_{parsed['id']}"):
+                parsed["carbon"] = carbon_est
+                st.session_state["weekly_plan"][day][meal_type] = parsed
+                for ing in parsed.get("ingredients", []):
+                    entry = {"name": ing.get("name"), "amount": ing.get("amount")}
+                    if "Uncategorized" not in st.session_state["shopping_list"]:
+                        st.session_state["shopping_list"]["Uncategorized"] = []
+                    if entry not in st.session_state["shopping_list"]["Uncategorized"]:
+                        st.session_state["shopping_list"]["Uncategorized"].append(entry)
+                st.success(f"Added {parsed.get('title')} to {day} — {meal_type}")
+
 def recipe_search_ui():
     st.header("🍲 Recipe Finder")
     col1, col2, col3 = st.columns([3,1,1])
@@ -468,49 +947,30 @@ def recipe_search_ui():
     prefs = st.session_state.get("preferences", {})
     diet = prefs.get("diet") if use_prefs else None
     intolerances = prefs.get("allergies") if use_prefs else None
-    if q:
+    collection = st.selectbox("📚 Or browse a collection (offline)", ["None"] + list_collections())
+    if collection != "None":
+        if q:
+            st.caption(f"Browsing the '{collection}' collection; set it to None to search TheMealDB for '{q}'.")
+        recipes = collection_recipes(collection)
+        if not recipes:
+            st.info("No recipes in this collection yet. Recipes are added as you search and plan.")
+            return
+        for parsed in recipes[:max_results]:
+            render_recipe_card(parsed)
+    elif q:
         results = mealdb_search_by_name(q)
         if not results:
             st.warning("No recipes found. Try different search terms.")
             return
+        parsed_results = []
         for r in results[:max_results]:
             detail = mealdb_lookup_id(r.get("idMeal"))
             parsed = parse_mealdb_details(detail)
-            if not parsed:
-                continue
-            with st.expander(parsed.get("title")):
-                image_url = parsed.get("image")
-                if image_url and isinstance(image_url, str) and image_url.startswith("http"):
-                    try:
-                        st.image(image_url, use_container_width=False, width=250)
-                    except Exception as e:
-                        st.write("Image not available for this recipe.")
-                        logger.error(f"Failed to load image {image_url}: {e}")
-                else:
-                    st.write("Image not available for this recipe.")
-                    logger.debug(f"No valid image for recipe {parsed.get('title')}: {image_url}")
-                st.markdown(f"**Cuisine / Area:** {parsed.get('area')}")
-                st.markdown("**Ingredients:**")
-                for ing in parsed.get("ingredients", []):
-                    st.write(f"- {ing.get('name')} — {ing.get('amount')}")
-                st.markdown("**Instructions:**")
-                st.write(parsed.get("instructions")[:1000] + ("..." if len(parsed.get("instructions", ""))>1000 else ""))
-                carbon_est = estimate_recipe_carbon_from_ingredients(parsed.get("ingredients", []))
-                st.info(f"Estimated recipe carbon footprint (heuristic): {carbon_est:.2f} kg CO₂")
-                pick_col1, pick_col2 = st.columns([1,3])
-                with pick_col1:
-                    st.caption("Quick add to plan:")
-                    day = st.selectbox("Day", ["Monday","Tuesday","Wednesday","Thursday","Friday","Saturday","Sunday"], key=f"quick_day_{parsed['id']}")
-                    meal_type = st.selectbox("Meal", ["Breakfast","Lunch","Dinner"], key=f"quick_meal_{parsed['id']}")
-                    if st.button("➕ Add to Plan", key=f"quick_add_{parsed['id']}"):
-                        st.session_state["weekly_plan"][day][meal_type] = parsed
-                        for ing in parsed.get("ingredients", []):
-                            entry = {"name": ing.get("name"), "amount": ing.get("amount")}
-                            if "Uncategorized" not in st.session_state["shopping_list"]:
-                                st.session_state["shopping_list"]["Uncategorized"] = []
-                            if entry not in st.session_state["shopping_list"]["Uncategorized"]:
-                                st.session_state["shopping_list"]["Uncategorized"].append(entry)
-                        st.success(f"Added {parsed.get('title')} to {day} — {meal_type}")
+            if parsed:
+                parsed_results.append(parsed)
+        add_recipes_to_catalog(parsed_results)
+        for parsed in parsed_results:
+            render_recipe_card(parsed)
 
 # ---------------------------
 # Shopping List UI
@@ -553,6 +1013,9 @@ def weekly_planner_ui():
         st.session_state["planner_cuisine"] = st.selectbox("🍴 Preferred Cuisine", ["Any", "Indian", "Italian", "Chinese", "Mexican", "Mediterranean"], index=0)
     with control_col3:
         st.session_state["planner_diet"] = st.selectbox("🥗 Diet Preference", ["Any", "Vegetarian", "Vegan", "Pescatarian", "Keto"], index=0)
+    collection_options = ["Any"] + list_collections()
+    current_collection = st.session_state.get("planner_collection", "Any")
+    st.session_state["planner_collection"] = st.selectbox("📚 Draw candidates from collection (offline, from recipes seen so far)", collection_options, index=collection_options.index(current_collection) if current_collection in collection_options else 0)
     st.markdown("### 🗓️ Your Weekly Plan")
     for day, meals in st.session_state["weekly_plan"].items():
         with st.expander(f"📅 {day}", expanded=False):
@@ -598,6 +1061,8 @@ def weekly_planner_ui():
         st.markdown("---")
         st.subheader(f"Select a candidate for {cp['day']} — {cp['meal_type']}")
         candidates = cp.get("candidates", [])
+        if cp.get("note"):
+            st.info(cp["note"])
         if not candidates:
             st.info("No compatible candidates found for your preferences.")
             if st.button("Close"):
@@ -620,6 +1085,45 @@ def weekly_planner_ui():
             if st.button("Cancel"):
                 st.session_state["__candidate_picker"] = None
 
+# ---------------------------
+# Carbon Analytics UI
+# ---------------------------
+def carbon_analytics_ui():
+    st.header("📈 Carbon Analytics")
+    st.caption("Aggregated over every plan saved to the server, one entry per user per week. Updated each time a plan is saved.")
+    stats, frames = load_carbon_rollup_frames()
+    if not stats.get("meals"):
+        st.info("No saved meals yet. Save a plan to the server to start collecting analytics.")
+        return
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Saved plan-weeks", stats["plans"])
+    col2.metric("Planned meals", stats["meals"])
+    col3.metric("Total carbon", f"{stats['total']:.2f} kg CO₂")
+    col4.metric("Avg per meal", f"{stats['total'] / stats['meals']:.2f} kg CO₂")
+    day_order = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+    charts = [
+        ("week", "🗓️ Carbon by Week", {"week": sorted(frames["week"]["week"])}),
+        ("day", "📅 Carbon by Day", {"day": day_order}),
+        ("meal_type", "🍽️ Carbon by Meal Type", {"meal_type": ["Breakfast", "Lunch", "Dinner"]}),
+        ("cuisine", "🍴 Carbon by Cuisine", {}),
+    ]
+    for dim, title, order in charts:
+        st.markdown(f"### {title}")
+        df = frames[dim]
+        if not order:
+            df = df.sort_values("carbon", ascending=False)
+        fig = px.bar(df, x=dim, y="carbon", category_orders=order, labels={"carbon": "kg CO₂"})
+        st.plotly_chart(fig, use_container_width=True)
+    st.markdown("### 🥕 Top Ingredients by Carbon")
+    top_n = st.slider("Ingredients to show", 5, 50, 15)
+    df = frames["ingredient"].nlargest(top_n, "carbon")
+    fig = px.bar(df, x="carbon", y="ingredient", orientation="h", labels={"carbon": "kg CO₂"})
+    fig.update_layout(yaxis={"categoryorder": "total ascending"})
+    st.plotly_chart(fig, use_container_width=True)
+    if st.button("🔄 Rebuild from all saved plans"):
+        rebuild_carbon_rollups()
+        st.rerun()
+
 # ---------------------------
 # Save / Load (sidebar)
 # ---------------------------
@@ -665,7 +1169,7 @@ with st.sidebar.expander("Save / Load Plan", expanded=True):
 st.sidebar.title("🍽 EcoMealAI Navigation")
 if "page" not in st.session_state:
     st.session_state["page"] = "Landing"
-page = st.sidebar.radio("Go to", ["Landing", "Preferences", "Recipes", "Shopping List", "Weekly Planner"], index=["Landing", "Preferences", "Recipes", "Shopping List", "Weekly Planner"].index(st.session_state["page"]))
+page = st.sidebar.radio("Go to", ["Landing", "Preferences", "Recipes", "Shopping List", "Weekly Planner", "Carbon Analytics"], index=["Landing", "Preferences", "Recipes", "Shopping List", "Weekly Planner", "Carbon Analytics"].index(st.session_state["page"]))
 if page != st.session_state["page"]:
     st.session_state["page"] = page
 if page == "Landing":
@@ -678,3 +1182,5 @@ elif page == "Shopping List":
     shopping_list_ui()
 elif page == "Weekly Planner":
     weekly_planner_ui()
+elif page == "Carbon Analytics":
+    carbon_analytics_ui()